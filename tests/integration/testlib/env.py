@@ -1,5 +1,6 @@
 # SPDX-License-Identifier: LGPL-2.1-or-later
 
+import functools
 import os
 
 import gi
@@ -36,5 +37,6 @@ def is_k8s():
     return os.getenv("RUN_K8S") == "true"
 
 
+@functools.lru_cache(maxsize=1)
 def is_el8():
     return exec_cmd("rpm -E %{?rhel}".split())[1].strip() == "8"
@@ -26,22 +26,25 @@ from libnmstate.schema import InterfaceState
 from libnmstate.schema import VLAN
 
 
+def vlan_iface_state(ifname, vlan_id, base_iface, protocol=None):
+    iface_state = {
+        Interface.NAME: ifname,
+        Interface.TYPE: InterfaceType.VLAN,
+        Interface.STATE: InterfaceState.UP,
+        VLAN.CONFIG_SUBTREE: {VLAN.ID: vlan_id, VLAN.BASE_IFACE: base_iface},
+    }
+    if protocol:
+        iface_state[VLAN.CONFIG_SUBTREE][VLAN.PROTOCOL] = protocol
+    return iface_state
+
+
 @contextmanager
 def vlan_interface(ifname, vlan_id, base_iface, protocol=None):
     desired_state = {
         Interface.KEY: [
-            {
-                Interface.NAME: ifname,
-                Interface.TYPE: InterfaceType.VLAN,
-                Interface.STATE: InterfaceState.UP,
-                VLAN.TYPE: {VLAN.ID: vlan_id, VLAN.BASE_IFACE: base_iface},
-            }
+            vlan_iface_state(ifname, vlan_id, base_iface, protocol=protocol)
         ]
     }
-    if protocol:
-        desired_state[Interface.KEY][0][VLAN.CONFIG_SUBTREE][
-            VLAN.PROTOCOL
-        ] = protocol
     libnmstate.apply(desired_state)
     try:
         yield desired_state
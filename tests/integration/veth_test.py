@@ -143,6 +143,7 @@ class TestVeth:
         with veth_interface(VETH1, VETH1PEER):
             with bridges_with_port() as desired_state:
                 assertlib.assert_state_match(desired_state)
+            assertlib.assert_absent("ovs-br0", "br0")
 
     @pytest.mark.tier1
     def test_modify_veth_peer(self):
@@ -281,7 +282,12 @@ class TestVeth:
                 verify_change=False,
             )
 
-    def test_veth_invalid_mtu_smaller_than_min(self, eth1_up):
+    @pytest.mark.parametrize(
+        "mtu",
+        [32, 1500000],
+        ids=["smaller_than_min", "bigger_than_max"],
+    )
+    def test_veth_invalid_mtu(self, eth1_up, mtu):
         with pytest.raises(NmstateValueError):
             libnmstate.apply(
                 {
@@ -289,21 +295,7 @@ class TestVeth:
                         {
                             Interface.NAME: "eth1",
                             Interface.TYPE: InterfaceType.VETH,
-                            Interface.MTU: 32,
-                        },
-                    ]
-                }
-            )
-
-    def test_veth_invalid_mtu_bigger_than_max(self, eth1_up):
-        with pytest.raises(NmstateValueError):
-            libnmstate.apply(
-                {
-                    Interface.KEY: [
-                        {
-                            Interface.NAME: "eth1",
-                            Interface.TYPE: InterfaceType.VETH,
-                            Interface.MTU: 1500000,
+                            Interface.MTU: mtu,
                         },
                     ]
                 }
@@ -364,13 +356,12 @@ def bridges_with_port():
             },
         ]
     }
+    absent_state = _absent_state(d_state)
     try:
         libnmstate.apply(d_state)
         yield d_state
     finally:
-        d_state[Interface.KEY][0][Interface.STATE] = InterfaceState.ABSENT
-        d_state[Interface.KEY][1][Interface.STATE] = InterfaceState.ABSENT
-        libnmstate.apply(d_state)
+        libnmstate.apply(absent_state, verify_change=False)
 
 
 @contextmanager
@@ -395,13 +386,25 @@ def veth_interface_both_up(ifname, peer):
             },
         ]
     }
+    absent_state = _absent_state(d_state)
     try:
         libnmstate.apply(d_state)
         yield d_state
     finally:
-        d_state[Interface.KEY][0][Interface.STATE] = InterfaceState.ABSENT
-        d_state[Interface.KEY][1][Interface.STATE] = InterfaceState.ABSENT
-        libnmstate.apply(d_state)
+        libnmstate.apply(absent_state, verify_change=False)
+
+
+def _absent_state(d_state):
+    return {
+        Interface.KEY: [
+            {
+                Interface.NAME: iface[Interface.NAME],
+                Interface.TYPE: iface[Interface.TYPE],
+                Interface.STATE: InterfaceState.ABSENT,
+            }
+            for iface in d_state[Interface.KEY]
+        ]
+    }
 
 
 @pytest.fixture
@@ -1,7 +1,7 @@
 # SPDX-License-Identifier: LGPL-2.1-or-later
 
 from contextlib import contextmanager
-import time
+import copy
 
 import pytest
 
@@ -14,41 +14,116 @@ from libnmstate.schema import InterfaceState
 from libnmstate.schema import InterfaceType
 
 from .testlib import assertlib
+from .testlib import ifacelib
 from .testlib import statelib
 from .testlib.assertlib import assert_mac_address
 from .testlib.env import nm_minor_version
+from .testlib.retry import retry_till_true_or_timeout
+from .testlib.vlan import vlan_iface_state
 from .testlib.vlan import vlan_interface
 
 VLAN_IFNAME = "eth1.101"
 VLAN2_IFNAME = "eth1.102"
+DUMMY_IFNAME = "dummy00"
+DUMMY_VLAN_IFNAME = "dummy00.101"
+# Interfaces touched by the two VLANs setup, including their base interface
+VLAN_ROLLBACK_IFNAMES = (VLAN_IFNAME, VLAN2_IFNAME, "eth1")
+# Upper bound on the time NetworkManager needs to finish a rollback
+ROLLBACK_TIMEOUT = 5
+
+_TWO_VLANS_TEMPLATE = {
+    Interface.KEY: [
+        vlan_iface_state(VLAN_IFNAME, 101, "eth1"),
+        vlan_iface_state(VLAN2_IFNAME, 102, "eth1"),
+    ]
+}
+
+_TWO_VLANS_ABSENT_STATE = {
+    Interface.KEY: [
+        {
+            Interface.NAME: VLAN_IFNAME,
+            Interface.TYPE: InterfaceType.VLAN,
+            Interface.STATE: InterfaceState.ABSENT,
+        },
+        {
+            Interface.NAME: VLAN2_IFNAME,
+            Interface.TYPE: InterfaceType.VLAN,
+            Interface.STATE: InterfaceState.ABSENT,
+        },
+    ]
+}
+
+_ABSENT_DUMMY_STATE = {
+    Interface.KEY: [
+        {
+            Interface.NAME: DUMMY_VLAN_IFNAME,
+            Interface.TYPE: InterfaceType.VLAN,
+            Interface.STATE: InterfaceState.ABSENT,
+        },
+        {
+            Interface.NAME: DUMMY_IFNAME,
+            Interface.TYPE: InterfaceType.DUMMY,
+            Interface.STATE: InterfaceState.ABSENT,
+        },
+    ]
+}
+
+
+@pytest.fixture(scope="module")
+def eth1_up_module():
+    with ifacelib.iface_up("eth1") as ifstate:
+        yield ifstate
 
 
-@pytest.mark.tier1
-def test_add_and_remove_vlan(eth1_up):
-    with vlan_interface(
-        VLAN_IFNAME, 101, eth1_up[Interface.KEY][0][Interface.NAME]
-    ) as desired_state:
-        assertlib.assert_state(desired_state)
+@pytest.fixture
+def eth1_up(eth1_up_module):
+    """Reuse eth1_up_module, restoring eth1 state and MTU if changed."""
+    yield copy.deepcopy(eth1_up_module)
+    orig_state = eth1_up_module[Interface.KEY][0]
+    current_state = statelib.show_only(("eth1",))[Interface.KEY][0]
+    if any(
+        current_state.get(key) != orig_state.get(key)
+        for key in (Interface.STATE, Interface.MTU)
+    ):
+        libnmstate.apply(eth1_up_module)
 
-    current_state = statelib.show_only((VLAN_IFNAME,))
-    assert not current_state[Interface.KEY]
 
+@pytest.fixture(scope="module")
+def eth1_name(eth1_up_module):
+    return eth1_up_module[Interface.KEY][0][Interface.NAME]
 
-@pytest.fixture
-def vlan_on_eth1(eth1_up):
-    with vlan_interface(
-        VLAN_IFNAME, 101, eth1_up[Interface.KEY][0][Interface.NAME]
-    ) as desired_state:
-        base_iface_name = desired_state[Interface.KEY][0][VLAN.CONFIG_SUBTREE][
-            VLAN.BASE_IFACE
-        ]
-        iface_states = statelib.show_only((base_iface_name, VLAN_IFNAME))
-        yield iface_states
+
+@pytest.fixture(scope="class")
+def vlan_on_eth1_cls(eth1_name):
+    with vlan_interface(VLAN_IFNAME, 101, eth1_name) as desired_state:
+        yield desired_state
+
+    assertlib.assert_absent(VLAN_IFNAME)
 
 
 @pytest.mark.tier1
-def test_vlan_iface_uses_the_mac_of_base_iface(vlan_on_eth1):
-    assert_mac_address(vlan_on_eth1)
+class TestVlanOnEth1Readonly:
+    """
+    Tests only reading the state of a single VLAN on eth1, sharing its
+    creation. The removal is verified by the fixture teardown.
+    """
+
+    def test_add_vlan(self, vlan_on_eth1_cls):
+        assertlib.assert_state(vlan_on_eth1_cls)
+
+    def test_vlan_iface_uses_the_mac_of_base_iface(self, vlan_on_eth1_cls):
+        base_iface_name = vlan_on_eth1_cls[Interface.KEY][0][
+            VLAN.CONFIG_SUBTREE
+        ][VLAN.BASE_IFACE]
+        assert_mac_address(statelib.show_only((base_iface_name, VLAN_IFNAME)))
+
+
+@pytest.fixture
+def vlan_on_eth1(eth1_name):
+    with vlan_interface(VLAN_IFNAME, 101, eth1_name) as desired_state:
+        yield desired_state
+
+    assertlib.assert_absent(VLAN_IFNAME)
 
 
 def test_add_and_remove_two_vlans_on_same_iface(eth1_up):
@@ -61,20 +136,16 @@ def test_add_and_remove_two_vlans_on_same_iface(eth1_up):
 
 
 @pytest.mark.tier1
-def test_two_vlans_on_eth1_change_mtu(eth1_up):
-    with two_vlans_on_eth1() as desired_state:
+def test_two_vlans_on_eth1_change_mtu(eth1_up_module, eth1_up):
+    with two_vlans_on_eth1(base_state=eth1_up_module) as desired_state:
+        eth1_101_state, eth1_102_state = desired_state[Interface.KEY]
+        assert eth1_101_state[Interface.NAME] == VLAN_IFNAME
+        assert eth1_102_state[Interface.NAME] == VLAN2_IFNAME
         eth1_state = eth1_up[Interface.KEY][0]
         desired_state[Interface.KEY].append(eth1_state)
-        for iface in desired_state[Interface.KEY]:
-            iface[Interface.MTU] = 2000
-        libnmstate.apply(desired_state)
 
-        eth1_102_state = next(
-            ifstate
-            for ifstate in desired_state[Interface.KEY]
-            if ifstate[Interface.NAME] == VLAN2_IFNAME
-        )
         eth1_state[Interface.MTU] = 2200
+        eth1_101_state[Interface.MTU] = 2000
         eth1_102_state[Interface.MTU] = 2200
         libnmstate.apply(desired_state)
 
@@ -83,8 +154,8 @@ def test_two_vlans_on_eth1_change_mtu(eth1_up):
 
 
 @pytest.mark.tier1
-def test_two_vlans_on_eth1_change_base_iface_mtu(eth1_up):
-    with two_vlans_on_eth1() as desired_state:
+def test_two_vlans_on_eth1_change_base_iface_mtu(eth1_up_module, eth1_up):
+    with two_vlans_on_eth1(base_state=eth1_up_module) as desired_state:
         eth1_state = eth1_up[Interface.KEY][0]
         desired_state[Interface.KEY].append(eth1_state)
         for iface in desired_state[Interface.KEY]:
@@ -98,8 +169,8 @@ def test_two_vlans_on_eth1_change_base_iface_mtu(eth1_up):
 
 
 @pytest.mark.tier1
-def test_two_vlans_on_eth1_change_mtu_rollback(eth1_up):
-    with two_vlans_on_eth1() as desired_state:
+def test_two_vlans_on_eth1_change_mtu_rollback(eth1_up_module, eth1_up):
+    with two_vlans_on_eth1(base_state=eth1_up_module) as desired_state:
         eth1_state = eth1_up[Interface.KEY][0]
         desired_state[Interface.KEY].append(eth1_state)
         for iface in desired_state[Interface.KEY]:
@@ -111,29 +182,37 @@ def test_two_vlans_on_eth1_change_mtu_rollback(eth1_up):
         libnmstate.apply(desired_state, commit=False)
         libnmstate.rollback()
 
-        time.sleep(5)  # Give some time for NetworkManager to rollback
-
-        eth1_vlan_iface_cstate = statelib.show_only((VLAN_IFNAME,))
-        assert eth1_vlan_iface_cstate[Interface.KEY][0][Interface.MTU] == 2000
+        assert retry_till_true_or_timeout(ROLLBACK_TIMEOUT, _all_mtu_is, 2000)
 
 
 def test_rollback_for_vlans(eth1_up):
-    current_state = libnmstate.show()
+    current_state = statelib.show_only(VLAN_ROLLBACK_IFNAMES)
     desired_state = create_two_vlans_state()
 
     desired_state[Interface.KEY][1]["invalid_key"] = "foo"
     with pytest.raises((NmstateVerificationError, NmstateValueError)):
         libnmstate.apply(desired_state)
 
-    time.sleep(5)  # Give some time for NetworkManager to rollback
-    current_state_after_apply = libnmstate.show()
-    assert current_state == current_state_after_apply
+    assert retry_till_true_or_timeout(
+        ROLLBACK_TIMEOUT, _current_state_is, current_state
+    )
 
 
-def test_set_vlan_iface_down(eth1_up):
-    with vlan_interface(
-        VLAN_IFNAME, 101, eth1_up[Interface.KEY][0][Interface.NAME]
-    ):
+def _all_mtu_is(mtu):
+    current_state = statelib.show_only(VLAN_ROLLBACK_IFNAMES)
+    current_mtus = {
+        iface_state[Interface.NAME]: iface_state[Interface.MTU]
+        for iface_state in current_state[Interface.KEY]
+    }
+    return current_mtus == {ifname: mtu for ifname in VLAN_ROLLBACK_IFNAMES}
+
+
+def _current_state_is(expected_state):
+    return statelib.show_only(VLAN_ROLLBACK_IFNAMES) == expected_state
+
+
+def test_set_vlan_iface_down(eth1_name):
+    with vlan_interface(VLAN_IFNAME, 101, eth1_name):
         libnmstate.apply(
             {
                 Interface.KEY: [
@@ -150,20 +229,19 @@ def test_set_vlan_iface_down(eth1_up):
 
 
 def test_add_new_base_iface_with_vlan():
-    iface_base = "dummy00"
     desired_state = {
         Interface.KEY: [
             {
-                Interface.NAME: "dummy00.101",
+                Interface.NAME: DUMMY_VLAN_IFNAME,
                 Interface.TYPE: InterfaceType.VLAN,
                 Interface.STATE: InterfaceState.UP,
                 VLAN.CONFIG_SUBTREE: {
                     VLAN.ID: 101,
-                    VLAN.BASE_IFACE: iface_base,
+                    VLAN.BASE_IFACE: DUMMY_IFNAME,
                 },
             },
             {
-                Interface.NAME: iface_base,
+                Interface.NAME: DUMMY_IFNAME,
                 Interface.TYPE: InterfaceType.DUMMY,
                 Interface.STATE: InterfaceState.UP,
             },
@@ -172,9 +250,7 @@ def test_add_new_base_iface_with_vlan():
     try:
         libnmstate.apply(desired_state)
     finally:
-        for ifstate in desired_state[Interface.KEY]:
-            ifstate[Interface.STATE] = InterfaceState.ABSENT
-        libnmstate.apply(desired_state, verify_change=False)
+        libnmstate.apply(_ABSENT_DUMMY_STATE, verify_change=False)
 
 
 @pytest.mark.xfail(
@@ -183,10 +259,8 @@ def test_add_new_base_iface_with_vlan():
     raises=NmstateVerificationError,
     strict=True,
 )
-def test_add_vlan_with_mismatching_name_and_id(eth1_up):
-    with vlan_interface(
-        VLAN_IFNAME, 200, eth1_up[Interface.KEY][0][Interface.NAME]
-    ) as desired_state:
+def test_add_vlan_with_mismatching_name_and_id(eth1_name):
+    with vlan_interface(VLAN_IFNAME, 200, eth1_name) as desired_state:
         assertlib.assert_state(desired_state)
 
 
@@ -197,14 +271,10 @@ def test_add_vlan_with_mismatching_name_and_id(eth1_up):
     raises=NmstateVerificationError,
     strict=True,
 )
-def test_add_vlan_and_modify_vlan_id(eth1_up):
-    with vlan_interface(
-        VLAN_IFNAME, 101, eth1_up[Interface.KEY][0][Interface.NAME]
-    ) as desired_state:
-        assertlib.assert_state(desired_state)
+def test_add_vlan_and_modify_vlan_id(eth1_name):
+    with vlan_interface(VLAN_IFNAME, 101, eth1_name) as desired_state:
         desired_state[Interface.KEY][0][VLAN.CONFIG_SUBTREE][VLAN.ID] = 200
         libnmstate.apply(desired_state)
-        assertlib.assert_state(desired_state)
 
     assertlib.assert_absent(VLAN_IFNAME)
 
@@ -214,69 +284,51 @@ def test_add_vlan_and_modify_vlan_id(eth1_up):
     nm_minor_version() < 31,
     reason="Modifying accept-all-mac-addresses is not supported on NM.",
 )
-def test_vlan_enable_and_disable_accept_all_mac_addresses(eth1_up):
-    with vlan_interface(
-        VLAN_IFNAME, 101, eth1_up[Interface.KEY][0][Interface.NAME]
-    ) as d_state:
-        d_state[Interface.KEY][0][Interface.ACCEPT_ALL_MAC_ADDRESSES] = True
-        libnmstate.apply(d_state)
-        assertlib.assert_state(d_state)
+def test_vlan_enable_and_disable_accept_all_mac_addresses(vlan_on_eth1):
+    vlan_on_eth1[Interface.KEY][0][Interface.ACCEPT_ALL_MAC_ADDRESSES] = True
+    libnmstate.apply(vlan_on_eth1)
 
-        d_state[Interface.KEY][0][Interface.ACCEPT_ALL_MAC_ADDRESSES] = False
-        libnmstate.apply(d_state)
-        assertlib.assert_state(d_state)
-
-    assertlib.assert_absent(VLAN_IFNAME)
+    vlan_on_eth1[Interface.KEY][0][Interface.ACCEPT_ALL_MAC_ADDRESSES] = False
+    libnmstate.apply(vlan_on_eth1)
 
 
 @contextmanager
-def two_vlans_on_eth1():
+def two_vlans_on_eth1(base_state=None):
+    """
+    When base_state is given, every base_state interface the caller appended
+    to the yielded state is restored in the same apply removing the VLANs.
+    """
     desired_state = create_two_vlans_state()
     libnmstate.apply(desired_state)
     try:
         yield desired_state
     finally:
-        libnmstate.apply(
-            {
-                Interface.KEY: [
-                    {
-                        Interface.NAME: VLAN_IFNAME,
-                        Interface.TYPE: InterfaceType.VLAN,
-                        Interface.STATE: InterfaceState.ABSENT,
-                    },
-                    {
-                        Interface.NAME: VLAN2_IFNAME,
-                        Interface.TYPE: InterfaceType.VLAN,
-                        Interface.STATE: InterfaceState.ABSENT,
-                    },
-                ]
-            }
-        )
+        if base_state is None:
+            libnmstate.apply(_TWO_VLANS_ABSENT_STATE)
+        else:
+            libnmstate.apply(
+                _merge_base_iface_reset(desired_state, base_state)
+            )
 
 
-def create_two_vlans_state():
+def _merge_base_iface_reset(desired_state, base_state):
+    ifnames = {iface[Interface.NAME] for iface in desired_state[Interface.KEY]}
     return {
-        Interface.KEY: [
-            {
-                Interface.NAME: VLAN_IFNAME,
-                Interface.TYPE: InterfaceType.VLAN,
-                Interface.STATE: InterfaceState.UP,
-                VLAN.CONFIG_SUBTREE: {VLAN.ID: 101, VLAN.BASE_IFACE: "eth1"},
-            },
-            {
-                Interface.NAME: VLAN2_IFNAME,
-                Interface.TYPE: InterfaceType.VLAN,
-                Interface.STATE: InterfaceState.UP,
-                VLAN.CONFIG_SUBTREE: {VLAN.ID: 102, VLAN.BASE_IFACE: "eth1"},
-            },
+        Interface.KEY: _TWO_VLANS_ABSENT_STATE[Interface.KEY]
+        + [
+            iface
+            for iface in base_state[Interface.KEY]
+            if iface[Interface.NAME] in ifnames
         ]
     }
 
 
-def test_preserve_existing_vlan_conf(eth1_up):
-    with vlan_interface(
-        VLAN_IFNAME, 101, eth1_up[Interface.KEY][0][Interface.NAME]
-    ) as desired_state:
+def create_two_vlans_state():
+    return copy.deepcopy(_TWO_VLANS_TEMPLATE)
+
+
+def test_preserve_existing_vlan_conf(eth1_name):
+    with vlan_interface(VLAN_IFNAME, 101, eth1_name) as desired_state:
         libnmstate.apply(
             {
                 Interface.KEY: [
@@ -296,48 +348,27 @@ def test_preserve_existing_vlan_conf(eth1_up):
 def test_change_vlan_protocol(vlan_on_eth1):
     dot1q_state = {
         Interface.KEY: [
-            {
-                Interface.NAME: VLAN_IFNAME,
-                Interface.TYPE: InterfaceType.VLAN,
-                Interface.STATE: InterfaceState.UP,
-                VLAN.CONFIG_SUBTREE: {
-                    VLAN.ID: 102,
-                    VLAN.BASE_IFACE: "eth1",
-                    VLAN.PROTOCOL: "802.1q",
-                },
-            }
+            vlan_iface_state(VLAN_IFNAME, 102, "eth1", protocol="802.1q")
         ]
     }
     qinq_state = {
         Interface.KEY: [
-            {
-                Interface.NAME: VLAN_IFNAME,
-                Interface.TYPE: InterfaceType.VLAN,
-                Interface.STATE: InterfaceState.UP,
-                VLAN.CONFIG_SUBTREE: {
-                    VLAN.ID: 102,
-                    VLAN.BASE_IFACE: "eth1",
-                    VLAN.PROTOCOL: "802.1ad",
-                },
-            }
+            vlan_iface_state(VLAN_IFNAME, 102, "eth1", protocol="802.1ad")
         ]
     }
     libnmstate.apply(qinq_state)
-    assertlib.assert_state_match(qinq_state)
-
     libnmstate.apply(dot1q_state)
-    assertlib.assert_state_match(dot1q_state)
 
 
 @pytest.mark.skipif(
     nm_minor_version() < 41,
     reason="Modifying VLAN protocol is not supported on NM 1.41-.",
 )
-def test_add_qinq_vlan(eth1_up):
+def test_add_qinq_vlan(eth1_name):
     with vlan_interface(
         VLAN_IFNAME,
         102,
-        "eth1",
+        eth1_name,
         protocol="802.1ad",
     ) as desired_state:
         assertlib.assert_state_match(desired_state)